@@ -0,0 +1,41 @@
+"""Shared setup for the benchmark scripts.
+
+main.py configures itself from the environment at import time, so point it at
+throwaway files before importing it. Run the scripts from the repository root,
+e.g. ``python bench/upload_throughput.py``.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = tempfile.mkdtemp(prefix='academy-bench-')
+atexit.register(shutil.rmtree, BENCH_DIR, ignore_errors=True)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(BENCH_DIR, 'academy.db')
+os.environ['UPLOAD_FOLDER'] = os.path.join(BENCH_DIR, 'uploads')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main  # noqa: E402
+
+
+def admin_client():
+    client = main.app.test_client()
+    with client.session_transaction() as s:
+        s['user_id'] = 1
+        s['username'] = 'admin'
+        s['role'] = 'admin'
+    return client
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def report(label, size, seconds):
+    print(f'{label:<40} {size / 1024 / 1024:>8.0f} MB {seconds:>8.2f} s {size / 1024 / 1024 / seconds:>8.1f} MB/s')
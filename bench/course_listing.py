@@ -0,0 +1,60 @@
+"""Per-request allocation and latency of a large course listing.
+
+Compares loading full Course entities (what the list views did before, with
+description/content loaded) against the CourseCard projection they use now.
+
+    python bench/course_listing.py --courses 10000
+"""
+import argparse
+import statistics
+import tracemalloc
+
+from sqlalchemy.orm import undefer_group
+
+from common import main, timed
+
+
+def seed(count, description_size, content_size):
+    with main.app.app_context():
+        main.db.session.execute(main.Course.__table__.insert(), [{
+            'title': f'Course {i}',
+            'description': 'd' * description_size,
+            'instructor': f'Instructor {i % 50}',
+            'duration': '6 hours',
+            'price': '$49',
+            'content': 'c' * content_size,
+        } for i in range(count)])
+        main.db.session.commit()
+
+
+def measure(load, repeats):
+    peaks, times = [], []
+    for _ in range(repeats):
+        with main.app.test_request_context():
+            tracemalloc.start()
+            rows, seconds = timed(load)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            main.db.session.remove()
+        times.append(seconds)
+    return len(rows), statistics.median(peaks), statistics.median(times)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--courses', type=int, default=10000)
+    parser.add_argument('--description-size', type=int, default=2000)
+    parser.add_argument('--content-size', type=int, default=20000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    seed(args.courses, args.description_size, args.content_size)
+
+    variants = [
+        ('before: full Course entities', lambda: main.Course.query.options(undefer_group('body')).all()),
+        ('after: CourseCard projection', lambda: main.course_cards()),
+    ]
+    print(f'{"":<32} {"rows":>8} {"peak alloc":>12} {"latency":>10}')
+    for label, load in variants:
+        rows, peak, seconds = measure(load, args.repeats)
+        print(f'{label:<32} {rows:>8} {peak / 1024 / 1024:>10.1f}MB {seconds * 1000:>8.0f}ms')
@@ -0,0 +1,73 @@
+"""Throughput of each course file Storage backend.
+
+Measures streaming put, put_file (parallel multipart on S3), full get and 1MB
+ranged gets. The S3 backend runs against the in-process stand-in client used
+by the tests unless --s3-endpoint/--s3-bucket point it at a real
+S3-compatible server (e.g. a local MinIO; requires boto3).
+
+    python bench/storage_throughput.py --size-mb 256
+"""
+import argparse
+import os
+import random
+import sys
+
+from common import BENCH_DIR, ROOT, main, report, timed
+
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+from fake_s3 import FakeS3Client  # noqa: E402
+
+RANGE_SIZE = 1024 * 1024
+
+
+def make_source(size):
+    path = os.path.join(BENCH_DIR, 'source.bin')
+    block = os.urandom(8 * 1024 * 1024)
+    with open(path, 'wb') as f:
+        written = 0
+        while written < size:
+            f.write(block[:size - written])
+            written += len(block[:size - written])
+    return path
+
+
+def run(name, storage, source, size, ranges):
+    with open(source, 'rb') as f:
+        _, seconds = timed(lambda: storage.put('stream.bin', f))
+    report(f'{name}: put (stream)', size, seconds)
+
+    staged = source + '.staged'
+    os.link(source, staged)
+    _, seconds = timed(lambda: storage.put_file('file.bin', staged))
+    report(f'{name}: put_file', size, seconds)
+
+    total, seconds = timed(lambda: sum(len(block) for block in storage.get('file.bin')))
+    assert total == size
+    report(f'{name}: get', size, seconds)
+
+    offsets = [random.randrange(0, size - RANGE_SIZE) for _ in range(ranges)]
+    _, seconds = timed(lambda: [b''.join(storage.get('file.bin', start, start + RANGE_SIZE - 1)) for start in offsets])
+    report(f'{name}: {ranges} x 1MB ranged get', ranges * RANGE_SIZE, seconds)
+
+    storage.delete('stream.bin')
+    storage.delete('file.bin')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=256)
+    parser.add_argument('--ranges', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=main.app.config['STORAGE_UPLOAD_WORKERS'])
+    parser.add_argument('--s3-endpoint')
+    parser.add_argument('--s3-bucket', default='course-files')
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    source = make_source(size)
+    s3_client = None if args.s3_endpoint else FakeS3Client()
+
+    run('local', main.LocalStorage(os.path.join(BENCH_DIR, 'files')), source, size, args.ranges)
+    run('s3' if args.s3_endpoint else 's3 (in-process stand-in)',
+        main.S3Storage(args.s3_bucket, endpoint_url=args.s3_endpoint, client=s3_client,
+                       part_size=main.app.config['STORAGE_PART_SIZE'], max_workers=args.workers),
+        source, size, args.ranges)
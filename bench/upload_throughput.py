@@ -0,0 +1,54 @@
+"""Resumable upload throughput through the Flask test client.
+
+Creates an upload session, PUTs the file in checksummed chunks and finalizes
+it into a CourseFile, reporting MB/s for the chunk phase and end to end.
+
+    python bench/upload_throughput.py --size-mb 1024 --chunk-mb 8
+"""
+import argparse
+import hashlib
+import os
+
+from common import admin_client, main, report, timed
+
+
+def run(size, chunk_size):
+    client = admin_client()
+    with main.app.app_context():
+        course_id = main.Course.query.first().id
+
+    # One random chunk is reused so generating 1GB of input is not measured
+    chunk = os.urandom(chunk_size)
+    checksum = hashlib.sha256(chunk).hexdigest()
+
+    def upload():
+        response = client.post(f'/admin/courses/{course_id}/uploads',
+                               json={'filename': 'benchmark.mp4', 'size': size})
+        upload_id = response.json['upload_id']
+        offset = 0
+        while offset < size:
+            data = chunk if offset + chunk_size <= size else chunk[:size - offset]
+            response = client.put(f'/admin/uploads/{upload_id}', data=data, headers={
+                'Upload-Offset': str(offset),
+                'Upload-Checksum': checksum if data is chunk else hashlib.sha256(data).hexdigest(),
+            })
+            assert response.status_code == 200, response.json
+            offset = response.json['offset']
+        return upload_id
+
+    upload_id, chunk_seconds = timed(upload)
+    response, finalize_seconds = timed(lambda: client.post(f'/admin/uploads/{upload_id}/finalize'))
+    assert response.status_code == 200, response.json
+
+    report(f'chunks ({chunk_size // 1024 // 1024}MB each)', size, chunk_seconds)
+    report('finalize', size, finalize_seconds)
+    report('end to end', size, chunk_seconds + finalize_seconds)
+    main.storage.delete(response.json['filename'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=1024)
+    parser.add_argument('--chunk-mb', type=int, default=8)
+    args = parser.parse_args()
+    run(args.size_mb * 1024 * 1024, args.chunk_mb * 1024 * 1024)
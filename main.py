@@ -1,30 +1,108 @@
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import relationship
-from sqlalchemy import func
+from flask_sqlalchemy.session import Session as FlaskSQLAlchemySession
+from sqlalchemy.orm import relationship, deferred, joinedload, undefer_group
+from sqlalchemy import func, inspect, Select
+from sqlalchemy.dialects import postgresql, sqlite
+import click
 import os
-from datetime import datetime
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+import fcntl
 import hashlib
+import hmac
+import math
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///academy.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///academy.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Read replica: read-only views query this engine when set. A sqlite replica
+# of a sqlite primary is kept in sync locally by copying the primary with the
+# backup API every REPLICA_REFRESH_SECONDS.
+app.config['READ_DATABASE_URI'] = os.environ.get('READ_DATABASE_URI')
+app.config['REPLICA_REFRESH_SECONDS'] = 5
+# After a user's own write their reads stay on the primary for this long
+app.config['READ_YOUR_WRITES_SECONDS'] = 2 * app.config['REPLICA_REFRESH_SECONDS']
+if app.config['READ_DATABASE_URI']:
+    app.config['SQLALCHEMY_BINDS'] = {'replica': app.config['READ_DATABASE_URI']}
+
+class RoutingSession(FlaskSQLAlchemySession):
+    # Send SELECTs issued from read-only views to the replica; everything
+    # else (flushes, inserts, updates, deletes) goes to the primary
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            is_read = isinstance(clause, Select) and not self._flushing
+            if has_request_context():
+                if not is_read:
+                    g.db_wrote = True
+                elif g.get('use_replica') and 'replica' in db.engines:
+                    return db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
 # Initialize SQLAlchemy
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
 
 # File upload configuration
-UPLOAD_FOLDER = 'uploads'
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
 ALLOWED_EXTENSIONS = {'pdf', 'mp4', 'avi', 'mov', 'wmv', 'txt', 'docx', 'pptx'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
 
+# Course file storage: 'local' keeps files in UPLOAD_FOLDER, 's3' in an
+# S3-compatible bucket (AWS, MinIO, ...) shared by every app node
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'local')
+app.config['S3_BUCKET'] = os.environ.get('S3_BUCKET')
+app.config['S3_ENDPOINT_URL'] = os.environ.get('S3_ENDPOINT_URL')
+app.config['S3_REGION'] = os.environ.get('S3_REGION')
+app.config['STORAGE_PART_SIZE'] = 8 * 1024 * 1024
+app.config['STORAGE_UPLOAD_WORKERS'] = 4
+app.config['DOWNLOAD_URL_EXPIRY'] = 300  # seconds
+
+# Resumable uploads: large files are sent as a series of chunks into a staging file
+UPLOAD_STAGING_FOLDER = os.path.join(UPLOAD_FOLDER, '.staging')
+app.config['UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024  # size suggested to clients
+app.config['UPLOAD_MAX_CHUNK_SIZE'] = 64 * 1024 * 1024
+app.config['UPLOAD_MAX_FILE_SIZE'] = 4 * 1024 * 1024 * 1024  # 4GB
+app.config['UPLOAD_SESSION_TTL'] = timedelta(hours=24)
+
+# Rate limiting configuration: scope -> (requests allowed, per seconds)
+app.config['RATELIMIT_BACKEND'] = os.environ.get('RATELIMIT_BACKEND', 'memory')  # 'memory' or 'sqlite'
+app.config['RATELIMIT_SQLITE_PATH'] = os.environ.get('RATELIMIT_SQLITE_PATH', 'ratelimit.db')
+app.config['RATE_LIMITS'] = {
+    'login': (5, 60),
+    'register': (3, 60),
+    'enrollment': (10, 60),
+}
+app.config['MAX_CONCURRENT_WRITES'] = 8
+# Number of reverse proxies in front of the app whose X-Forwarded-* headers are
+# trusted, so rate limits key on the real client IP. Cloud Run (K_SERVICE set)
+# sits behind one proxy; local runs trust none, so the header cannot be spoofed.
+app.config['TRUSTED_PROXY_HOPS'] = int(os.environ.get('TRUSTED_PROXY_HOPS', 1 if 'K_SERVICE' in os.environ else 0))
+if app.config['TRUSTED_PROXY_HOPS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app,
+                            x_for=app.config['TRUSTED_PROXY_HOPS'],
+                            x_proto=app.config['TRUSTED_PROXY_HOPS'],
+                            x_host=app.config['TRUSTED_PROXY_HOPS'])
+
 # Create upload directory
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
+if not os.path.exists(UPLOAD_STAGING_FOLDER):
+    os.makedirs(UPLOAD_STAGING_FOLDER)
 
 # SQLAlchemy Models
 class User(db.Model):
@@ -47,11 +125,12 @@ class Course(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
-    description = db.Column(db.Text)
+    # Unbounded text columns are only loaded when accessed (or undeferred)
+    description = deferred(db.Column(db.Text), group='body')
     instructor = db.Column(db.String(100))
     duration = db.Column(db.String(50))
     price = db.Column(db.String(20))
-    content = db.Column(db.Text)
+    content = deferred(db.Column(db.Text), group='body')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     manager_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     
@@ -72,6 +151,10 @@ class Enrollment(db.Model):
     # Relationships
     user = relationship('User', back_populates='enrollments')
     course = relationship('Course', back_populates='enrollments')
+    
+    __table_args__ = (
+        db.Index('uq_enrollments_user_course', 'user_id', 'course_id', unique=True),
+    )
 
 class Evaluation(db.Model):
     __tablename__ = 'evaluations'
@@ -105,10 +188,67 @@ class CourseFile(db.Model):
     # Relationships
     course = relationship('Course', back_populates='files')
 
+class PaymentAttempt(db.Model):
+    __tablename__ = 'payment_attempts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    payment_method = db.Column(db.String(20))
+    status = db.Column(db.String(20), default='pending')  # pending, succeeded, failed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UploadSession(db.Model):
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    original_filename = db.Column(db.String(255), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    offset = db.Column(db.BigInteger, nullable=False, default=0)
+    chunk_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class AnalyticsRollup(db.Model):
+    __tablename__ = 'analytics_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    bucket_size = db.Column(db.String(10), nullable=False)  # hour, day, all
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    metric = db.Column(db.String(20), nullable=False)  # signups, courses, enrollments, evaluations, revenue
+    course_id = db.Column(db.Integer, nullable=False, default=0)  # 0 for platform-wide metrics
+    value = db.Column(db.Float, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('uq_analytics_rollups_bucket', 'bucket_size', 'bucket_start', 'metric', 'course_id', unique=True),
+    )
+
 def init_db():
     with app.app_context():
         db.create_all()
         
+        # Existing databases predate the unique enrollment index: drop duplicate
+        # enrollments (keeping the earliest) so the index can be created. New
+        # databases get the index from create_all and skip this.
+        enrollment_indexes = {index['name'] for index in inspect(db.engine).get_indexes('enrollments')}
+        if 'uq_enrollments_user_course' not in enrollment_indexes:
+            db.session.execute(db.text(
+                'DELETE FROM enrollments WHERE id NOT IN '
+                '(SELECT MIN(id) FROM enrollments GROUP BY user_id, course_id)'
+            ))
+            db.session.execute(db.text(
+                'CREATE UNIQUE INDEX uq_enrollments_user_course '
+                'ON enrollments (user_id, course_id)'
+            ))
+        
+        # Keep the admin dashboard's "recent activity" lookups index-only
+        db.session.execute(db.text('CREATE INDEX IF NOT EXISTS ix_users_created_at ON users (created_at)'))
+        db.session.execute(db.text('CREATE INDEX IF NOT EXISTS ix_evaluations_created_at ON evaluations (created_at)'))
+        
         # Insert default admin user
         admin = User.query.filter_by(username='admin').first()
         if not admin:
@@ -178,6 +318,10 @@ def init_db():
                 db.session.add(course)
         
         db.session.commit()
+        
+        # Build rollups for databases created before analytics (or all-time totals) existed
+        if AnalyticsRollup.query.filter_by(bucket_size=ALL_TIME_BUCKET).first() is None:
+            backfill_rollups()
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
@@ -212,12 +356,686 @@ def require_admin(f):
     wrapper.__name__ = f.__name__
     return wrapper
 
+# Read models: narrow column projections for list views, returned as
+# namedtuples so rendering a listing never builds full Course entities
+CourseCard = namedtuple('CourseCard', ['id', 'title', 'description', 'instructor', 'duration', 'price', 'created_at'])
+# Same shape as the (Course, avg_rating, rating_count, enrollment_count) rows it replaces
+CourseListing = namedtuple('CourseListing', ['Course', 'avg_rating', 'rating_count', 'enrollment_count'])
+CourseRecommendation = namedtuple('CourseRecommendation', ['Course', 'avg_rating', 'rating_count'])
+CARD_DESCRIPTION_LENGTH = 300
+
+def course_card_columns():
+    return (
+        Course.id,
+        Course.title,
+        func.substr(Course.description, 1, CARD_DESCRIPTION_LENGTH).label('description'),
+        Course.instructor,
+        Course.duration,
+        Course.price,
+        Course.created_at
+    )
+
+def course_cards(*criteria, limit=None):
+    query = db.session.query(*course_card_columns()).filter(*criteria).order_by(Course.id)
+    if limit:
+        query = query.limit(limit)
+    return [CourseCard(*row) for row in query]
+
+# Course file storage
+class Storage(ABC):
+    """Where course files live. Keys are the stored (unique) file names."""
+
+    @abstractmethod
+    def put(self, key, stream):
+        # Store a file-like object; returns the number of bytes written
+        pass
+
+    def put_file(self, key, path):
+        # Store a local file and remove it; returns its size
+        with open(path, 'rb') as f:
+            size = self.put(key, f)
+        os.remove(path)
+        return size
+
+    @abstractmethod
+    def get(self, key, start=0, end=None):
+        # Yield the bytes of key from start to end (inclusive)
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    @abstractmethod
+    def download_url(self, key, download_name):
+        # Short-lived URL the client can fetch the file from directly
+        pass
+
+class LocalStorage(Storage):
+    def __init__(self, root, block_size=1024 * 1024):
+        self.root = root
+        self.block_size = block_size
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        path = safe_join(self.root, key)
+        if path is None:
+            raise FileNotFoundError(key)
+        return path
+
+    def put(self, key, stream):
+        path = self.path(key)
+        with open(path + '.part', 'wb') as f:
+            shutil.copyfileobj(stream, f, self.block_size)
+        os.replace(path + '.part', path)
+        return os.path.getsize(path)
+
+    def put_file(self, key, path):
+        os.replace(path, self.path(key))
+        return os.path.getsize(self.path(key))
+
+    def get(self, key, start=0, end=None):
+        with open(self.path(key), 'rb') as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                block = f.read(self.block_size if remaining is None else min(self.block_size, remaining))
+                if not block:
+                    break
+                if remaining is not None:
+                    remaining -= len(block)
+                yield block
+
+    def delete(self, key):
+        if os.path.exists(self.path(key)):
+            os.remove(self.path(key))
+
+    def download_url(self, key, download_name):
+        if not os.path.exists(self.path(key)):
+            raise FileNotFoundError(key)
+        expires = int(time.time()) + app.config['DOWNLOAD_URL_EXPIRY']
+        return url_for('serve_signed_file', key=key, name=download_name, expires=expires,
+                       signature=sign_download(key, download_name, expires))
+
+class S3Storage(Storage):
+    def __init__(self, bucket, endpoint_url=None, region=None, client=None,
+                 part_size=8 * 1024 * 1024, max_workers=4):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError('STORAGE_BACKEND=s3 requires boto3 (pip install boto3)')
+            client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+        self.client = client
+        self.bucket = bucket
+        self.part_size = max(part_size, 5 * 1024 * 1024)  # S3 minimum part size
+        self.max_workers = max_workers
+
+    def put(self, key, stream):
+        first = stream.read(self.part_size)
+        if len(first) < self.part_size:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=first)
+            return len(first)
+        
+        # Streams of unknown length go up as a sequential multipart upload
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key)['UploadId']
+        try:
+            parts, size, part = [], 0, first
+            while part:
+                parts.append(self._upload_part(key, upload_id, len(parts) + 1, part))
+                size += len(part)
+                part = stream.read(self.part_size)
+            self._complete(key, upload_id, parts)
+            return size
+        except Exception:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+    def put_file(self, key, path):
+        size = os.path.getsize(path)
+        if size <= self.part_size:
+            with open(path, 'rb') as f:
+                self.client.put_object(Bucket=self.bucket, Key=key, Body=f.read())
+            os.remove(path)
+            return size
+        
+        # Known-size files upload their parts in parallel, each worker reading its own range
+        def upload_range(part_number):
+            with open(path, 'rb') as f:
+                f.seek((part_number - 1) * self.part_size)
+                return self._upload_part(key, upload_id, part_number, f.read(self.part_size))
+        
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key)['UploadId']
+        try:
+            part_count = math.ceil(size / self.part_size)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                parts = list(executor.map(upload_range, range(1, part_count + 1)))
+            self._complete(key, upload_id, parts)
+        except Exception:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+        os.remove(path)
+        return size
+
+    def _upload_part(self, key, upload_id, part_number, data):
+        response = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                           PartNumber=part_number, Body=data)
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+
+    def _complete(self, key, upload_id, parts):
+        self.client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                              MultipartUpload={'Parts': parts})
+
+    def get(self, key, start=0, end=None):
+        params = {'Bucket': self.bucket, 'Key': key}
+        if start or end is not None:
+            params['Range'] = f'bytes={start}-{"" if end is None else end}'
+        try:
+            body = self.client.get_object(**params)['Body']
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(key)
+        except self.client.exceptions.ClientError as e:
+            # A range starting past the end reads nothing, as it does locally
+            if e.response.get('Error', {}).get('Code') == 'InvalidRange':
+                return
+            raise
+        for block in body.iter_chunks(1024 * 1024):
+            yield block
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def download_url(self, key, download_name):
+        # Presigned URL: the client downloads straight from the bucket
+        return self.client.generate_presigned_url('get_object', Params={
+            'Bucket': self.bucket,
+            'Key': key,
+            'ResponseContentDisposition': f'attachment; filename="{download_name}"'
+        }, ExpiresIn=app.config['DOWNLOAD_URL_EXPIRY'])
+
+def sign_download(key, download_name, expires):
+    message = f'{key}\n{download_name}\n{expires}'.encode()
+    return hmac.new(app.secret_key.encode(), message, hashlib.sha256).hexdigest()
+
+def create_storage():
+    if app.config['STORAGE_BACKEND'] == 's3':
+        return S3Storage(app.config['S3_BUCKET'],
+                         endpoint_url=app.config['S3_ENDPOINT_URL'],
+                         region=app.config['S3_REGION'],
+                         part_size=app.config['STORAGE_PART_SIZE'],
+                         max_workers=app.config['STORAGE_UPLOAD_WORKERS'])
+    return LocalStorage(app.config['UPLOAD_FOLDER'])
+
+storage = create_storage()
+
+# Read/write routing
+def read_only(f):
+    # Serve the view from the read replica unless the user wrote recently
+    def wrapper(*args, **kwargs):
+        last_write_at = session.get('last_write_at', 0)
+        g.use_replica = time.time() - last_write_at > app.config['READ_YOUR_WRITES_SECONDS']
+        return f(*args, **kwargs)
+    wrapper.__name__ = f.__name__
+    return wrapper
+
+@app.after_request
+def remember_write(response):
+    if g.get('db_wrote'):
+        session['last_write_at'] = time.time()
+    return response
+
+class SQLiteReplicaRefresher:
+    """Copies the primary sqlite file onto the replica file with the backup API."""
+
+    def __init__(self, primary_path, replica_path, interval):
+        self.primary_path = primary_path
+        self.replica_path = replica_path
+        self.interval = interval
+        self.last_refresh = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def refresh(self):
+        source = sqlite3.connect(self.primary_path)
+        target = sqlite3.connect(self.replica_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        self.last_refresh = time.time()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.refresh()
+            except sqlite3.Error as e:
+                app.logger.warning('Replica refresh failed: %s', e)
+
+    def start(self):
+        self.refresh()
+        self.thread = threading.Thread(target=self.run, name='replica-refresher', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+def create_replica_refresher():
+    if 'replica' not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return None
+    with app.app_context():
+        primary, replica = db.engines[None].url, db.engines['replica'].url
+    if primary.get_backend_name() != 'sqlite' or replica.get_backend_name() != 'sqlite':
+        return None  # a real replica is kept in sync by the database server
+    return SQLiteReplicaRefresher(primary.database, replica.database, app.config['REPLICA_REFRESH_SECONDS'])
+
+# Rate limiting and admission control
+class RateLimiterBusy(Exception):
+    """The shared rate limit store could not be locked in time."""
+
+def refill_bucket(tokens, updated, rate, burst, now):
+    # Returns (allowed, tokens left, time at which the bucket is full again)
+    tokens = min(burst, tokens + (now - updated) * rate)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    return allowed, tokens, now + (burst - tokens) / rate
+
+class MemoryRateLimitBackend:
+    """Token buckets kept in process memory (one worker process).
+
+    Buckets that have refilled are dropped every prune_interval seconds, and
+    at most max_buckets are kept (least recently used go first), so random
+    usernames cannot grow memory without bound.
+    """
+
+    def __init__(self, max_buckets=100000, prune_interval=30):
+        self.buckets = OrderedDict()
+        self.max_buckets = max_buckets
+        self.prune_interval = prune_interval
+        self.last_prune = 0
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst, now):
+        with self.lock:
+            tokens, updated, _ = self.buckets.pop(key, (burst, now, now))
+            allowed, tokens, full_at = refill_bucket(tokens, updated, rate, burst, now)
+            self.buckets[key] = (tokens, now, full_at)
+            
+            if now - self.last_prune >= self.prune_interval:
+                self.prune(now)
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+            return allowed, tokens
+
+    def prune(self, now):
+        for key in [key for key, (_, _, full_at) in self.buckets.items() if full_at <= now]:
+            del self.buckets[key]
+        self.last_prune = now
+
+class SQLiteRateLimitBackend:
+    """Token buckets shared between worker processes through a SQLite file."""
+
+    def __init__(self, path, timeout=0.5, prune_interval=30):
+        self.path = path
+        self.timeout = timeout
+        self.prune_interval = prune_interval
+        self.last_prune = 0
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, '
+                'full_at REAL NOT NULL DEFAULT 0)'
+            )
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(rate_limit_buckets)')]
+            if 'full_at' not in columns:
+                conn.execute('ALTER TABLE rate_limit_buckets ADD COLUMN full_at REAL NOT NULL DEFAULT 0')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_rate_limit_buckets_full_at ON rate_limit_buckets (full_at)')
+        finally:
+            conn.close()
+
+    def take(self, key, rate, burst, now):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            # BEGIN IMMEDIATE serialises the read-modify-write across processes
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?', (key,)
+            ).fetchone()
+            tokens, updated = row if row else (burst, now)
+            allowed, tokens, full_at = refill_bucket(tokens, updated, rate, burst, now)
+            conn.execute(
+                'INSERT INTO rate_limit_buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, '
+                'updated = excluded.updated, full_at = excluded.full_at',
+                (key, tokens, now, full_at)
+            )
+            if now - self.last_prune >= self.prune_interval:
+                conn.execute('DELETE FROM rate_limit_buckets WHERE full_at <= ?', (now,))
+                self.last_prune = now
+            conn.execute('COMMIT')
+            return allowed, tokens
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            if isinstance(e, sqlite3.OperationalError) and 'locked' in str(e):
+                raise RateLimiterBusy() from e
+            raise
+        finally:
+            conn.close()
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def hit(self, key, limit, period):
+        """Take one token for key. Returns (allowed, retry_after_seconds)."""
+        rate = limit / period
+        allowed, tokens = self.backend.take(key, rate, limit, time.time())
+        if allowed:
+            return True, 0
+        return False, max(1, math.ceil((1 - tokens) / rate))
+
+class ConcurrencyLimiter:
+    """Caps the number of in-flight write requests; excess requests are shed."""
+
+    def __init__(self, max_in_flight):
+        self.semaphore = threading.BoundedSemaphore(max_in_flight)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+
+    def try_acquire(self):
+        if not self.semaphore.acquire(blocking=False):
+            return False
+        with self.lock:
+            self.in_flight += 1
+        return True
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+        self.semaphore.release()
+
+def create_rate_limiter():
+    if app.config['RATELIMIT_BACKEND'] == 'sqlite':
+        return RateLimiter(SQLiteRateLimitBackend(app.config['RATELIMIT_SQLITE_PATH']))
+    return RateLimiter(MemoryRateLimitBackend())
+
+rate_limiter = create_rate_limiter()
+write_limiter = ConcurrencyLimiter(app.config['MAX_CONCURRENT_WRITES'])
+rate_limit_counters = Counter()
+rate_limit_counters_lock = threading.Lock()
+
+def count_rate_limit(name):
+    with rate_limit_counters_lock:
+        rate_limit_counters[name] += 1
+
+def too_many_requests(status, retry_after, message):
+    response = jsonify({'error': message, 'retry_after': retry_after})
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def rate_limited(scope, methods=None):
+    """Throttle a view per client IP and per username before it touches the DB.
+
+    Username is taken from the session, or from the submitted form for login
+    and register. Only the listed HTTP methods are throttled (all if None).
+    """
+    def decorator(f):
+        def wrapper(*args, **kwargs):
+            if methods and request.method not in methods:
+                return f(*args, **kwargs)
+
+            limit, period = app.config['RATE_LIMITS'][scope]
+            ip = request.remote_addr or 'unknown'
+            username = session.get('username') or request.form.get('username')
+            try:
+                allowed, retry_after = rate_limiter.hit(f'{scope}:ip:{ip}', limit, period)
+                if not allowed:
+                    count_rate_limit(f'{scope}.limited_ip')
+                    return too_many_requests(429, retry_after, 'Too many requests, please try again later')
+
+                if username:
+                    allowed, retry_after = rate_limiter.hit(f'{scope}:user:{username.lower()}', limit, period)
+                    if not allowed:
+                        count_rate_limit(f'{scope}.limited_user')
+                        return too_many_requests(429, retry_after, 'Too many requests, please try again later')
+            except RateLimiterBusy:
+                # The shared limiter store is contended: shed rather than fail
+                count_rate_limit(f'{scope}.shed')
+                return too_many_requests(503, 1, 'Server busy, please try again shortly')
+
+            if not write_limiter.try_acquire():
+                count_rate_limit(f'{scope}.shed')
+                return too_many_requests(503, 1, 'Server busy, please try again shortly')
+            try:
+                count_rate_limit(f'{scope}.allowed')
+                return f(*args, **kwargs)
+            finally:
+                write_limiter.release()
+        wrapper.__name__ = f.__name__
+        return wrapper
+    return decorator
+
+# Enrollment service
+def dialect_insert(model):
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+def insert_ignoring_conflicts(model, rows, index_elements):
+    # Single INSERT ... ON CONFLICT DO NOTHING; returns the number of rows inserted
+    stmt = dialect_insert(model).values(rows).on_conflict_do_nothing(index_elements=index_elements)
+    return db.session.execute(stmt).rowcount
+
+def enroll_user(user_id, course_id):
+    # Returns True if a new enrollment was created, False if it already existed
+    inserted = insert_ignoring_conflicts(
+        Enrollment,
+        [{'user_id': user_id, 'course_id': course_id, 'enrolled_at': datetime.utcnow()}],
+        ['user_id', 'course_id']
+    )
+    if inserted:
+        record_metric('enrollments', course_id=course_id)
+    return inserted > 0
+
+def enroll_users(user_ids, course_id):
+    # Bulk-enroll a cohort in one statement; already enrolled users are skipped
+    now = datetime.utcnow()
+    rows = [{'user_id': user_id, 'course_id': course_id, 'enrolled_at': now} for user_id in set(user_ids)]
+    if not rows:
+        return 0
+    inserted = insert_ignoring_conflicts(Enrollment, rows, ['user_id', 'course_id'])
+    if inserted:
+        record_metric('enrollments', inserted, course_id=course_id)
+    return inserted
+
+def is_enrolled(user_id, course_id):
+    return db.session.query(
+        Enrollment.query.filter_by(user_id=user_id, course_id=course_id).exists()
+    ).scalar()
+
+def start_payment_attempt(idempotency_key, user_id, course_id, amount, payment_method):
+    # Returns (attempt, created). created is False when the key was already used,
+    # in which case the caller replays the stored outcome instead of charging again
+    created = insert_ignoring_conflicts(
+        PaymentAttempt,
+        [{
+            'idempotency_key': idempotency_key,
+            'user_id': user_id,
+            'course_id': course_id,
+            'amount': amount,
+            'payment_method': payment_method,
+            'status': 'pending',
+            'created_at': datetime.utcnow()
+        }],
+        ['idempotency_key']
+    ) > 0
+    attempt = PaymentAttempt.query.filter_by(idempotency_key=idempotency_key).first()
+    return attempt, created
+
+def calculate_total_price(course):
+    # Raises ValueError for prices that are not a dollar amount (e.g. 'Free')
+    course_price = float(course.price.replace('$', ''))
+    platform_fee = 2.99
+    return round(course_price + platform_fee, 2)
+
+# Analytics rollups
+ROLLUP_BUCKETS = ('hour', 'day')
+# One platform-wide row per metric holds the all-time total, so dashboard
+# totals read a fixed number of rows however much history there is
+ALL_TIME_BUCKET = 'all'
+ALL_TIME_START = datetime(1970, 1, 1)
+
+def bucket_start(bucket_size, at):
+    start = at.replace(minute=0, second=0, microsecond=0)
+    if bucket_size == 'day':
+        start = start.replace(hour=0)
+    return start
+
+def record_metric(metric, amount=1, course_id=0, at=None):
+    # Add to the hourly, daily and all-time counters in the caller's transaction
+    at = at or datetime.utcnow()
+    buckets = [(bucket_size, bucket_start(bucket_size, at), course_id) for bucket_size in ROLLUP_BUCKETS]
+    buckets.append((ALL_TIME_BUCKET, ALL_TIME_START, 0))
+    for bucket_size, start, bucket_course_id in buckets:
+        stmt = dialect_insert(AnalyticsRollup).values(
+            bucket_size=bucket_size,
+            bucket_start=start,
+            metric=metric,
+            course_id=bucket_course_id,
+            value=amount
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['bucket_size', 'bucket_start', 'metric', 'course_id'],
+            set_={'value': AnalyticsRollup.value + stmt.excluded.value}
+        )
+        db.session.execute(stmt)
+
+def move_metric(metric, course_id, old_at, new_at):
+    # Move one count between buckets when a row's timestamp changes, dropping
+    # buckets it leaves empty so the counters match what backfill_rollups builds
+    if old_at is None:
+        record_metric(metric, course_id=course_id, at=new_at)
+        return
+    record_metric(metric, -1, course_id, at=old_at)
+    record_metric(metric, 1, course_id, at=new_at)
+    AnalyticsRollup.query.filter(
+        AnalyticsRollup.metric == metric,
+        AnalyticsRollup.course_id == course_id,
+        AnalyticsRollup.bucket_size.in_(ROLLUP_BUCKETS),
+        AnalyticsRollup.bucket_start.in_([bucket_start(size, old_at) for size in ROLLUP_BUCKETS]),
+        AnalyticsRollup.value == 0
+    ).delete(synchronize_session=False)
+
+def rollup_sources():
+    # metric -> (timestamp column, course column or None, value expression, filters)
+    return {
+        'signups': (User.created_at, None, func.count(User.id), []),
+        'courses': (Course.created_at, None, func.count(Course.id), []),
+        'enrollments': (Enrollment.enrolled_at, Enrollment.course_id, func.count(Enrollment.id), []),
+        'evaluations': (Evaluation.created_at, Evaluation.course_id, func.count(Evaluation.id), []),
+        'revenue': (PaymentAttempt.created_at, PaymentAttempt.course_id, func.sum(PaymentAttempt.amount),
+                    [PaymentAttempt.status == 'succeeded']),
+    }
+
+def backfill_rollups():
+    # Recompute every rollup from the source tables' timestamps in a single
+    # transaction. Concurrent record_metric() upserts must wait until the
+    # rebuild commits, otherwise they could land between the DELETE and the
+    # re-insert and be lost or collide: PostgreSQL takes an explicit table
+    # lock; on SQLite the DELETE takes the database write lock, which is held
+    # until the commit.
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text('LOCK TABLE analytics_rollups IN EXCLUSIVE MODE'))
+    AnalyticsRollup.query.delete()
+    bucket_formats = {'hour': '%Y-%m-%d %H:00:00', 'day': '%Y-%m-%d 00:00:00'}
+    
+    for metric, (timestamp, course_column, value, filters) in rollup_sources().items():
+        total = db.session.query(value).filter(*filters).scalar()
+        db.session.add(AnalyticsRollup(bucket_size=ALL_TIME_BUCKET, bucket_start=ALL_TIME_START,
+                                       metric=metric, course_id=0, value=total or 0))
+        
+        for bucket_size in ROLLUP_BUCKETS:
+            if db.engine.dialect.name == 'postgresql':
+                bucket = func.date_trunc(bucket_size, timestamp)
+            else:
+                bucket = func.strftime(bucket_formats[bucket_size], timestamp)
+            course = course_column if course_column is not None else db.literal(0)
+            rows = db.session.query(
+                bucket.label('bucket'), course.label('course_id'), value.label('value')
+            ).filter(timestamp.isnot(None), *filters).group_by(bucket, course).all()
+            
+            db.session.add_all([
+                AnalyticsRollup(
+                    bucket_size=bucket_size,
+                    bucket_start=row.bucket if isinstance(row.bucket, datetime)
+                    else datetime.strptime(row.bucket, '%Y-%m-%d %H:%M:%S'),
+                    metric=metric,
+                    course_id=row.course_id,
+                    value=row.value or 0
+                )
+                for row in rows
+            ])
+    
+    db.session.commit()
+
+def metric_totals():
+    rows = db.session.query(
+        AnalyticsRollup.metric, func.sum(AnalyticsRollup.value)
+    ).filter_by(bucket_size=ALL_TIME_BUCKET, course_id=0).group_by(AnalyticsRollup.metric).all()
+    return {metric: total for metric, total in rows}
+
+def metric_series(metric, bucket_size='day', periods=30, course_id=None):
+    # Returns [(bucket_start, value)] for the last `periods` buckets, zero-filled
+    step = timedelta(hours=1) if bucket_size == 'hour' else timedelta(days=1)
+    end = bucket_start(bucket_size, datetime.utcnow())
+    start = end - step * (periods - 1)
+    
+    query = db.session.query(
+        AnalyticsRollup.bucket_start, func.sum(AnalyticsRollup.value)
+    ).filter(
+        AnalyticsRollup.bucket_size == bucket_size,
+        AnalyticsRollup.metric == metric,
+        AnalyticsRollup.bucket_start >= start
+    )
+    if course_id is not None:
+        query = query.filter(AnalyticsRollup.course_id == course_id)
+    values = dict(query.group_by(AnalyticsRollup.bucket_start).all())
+    
+    return [(start + step * i, values.get(start + step * i, 0)) for i in range(periods)]
+
+@app.cli.command('backfill-rollups')
+def backfill_rollups_command():
+    """Recompute analytics rollups from created_at/enrolled_at."""
+    backfill_rollups()
+    print('Analytics rollups rebuilt')
+
 # Initialize database
 init_db()
 
+# Created here but started only once: by the `flask replica-refresher`
+# process or by the server in __main__, never by every importing process
+replica_refresher = create_replica_refresher()
+
+@app.cli.command('replica-refresher')
+@click.option('--once', is_flag=True, help='Refresh the replica once and exit.')
+def replica_refresher_command(once):
+    """Keep the sqlite read replica in sync with the primary."""
+    if not replica_refresher:
+        print('No sqlite read replica configured (READ_DATABASE_URI)')
+        return
+    replica_refresher.refresh()
+    if not once:
+        replica_refresher.run()
+
 @app.route('/')
+@read_only
 def home():
-    courses = Course.query.limit(2).all()
+    courses = course_cards(limit=2)
     return render_template('home.html', courses=courses)
 
 @app.route('/about')
@@ -229,6 +1047,7 @@ def contact():
     return render_template('contact.html')
 
 @app.route('/instructors')
+@read_only
 def instructors():
     # Get instructors with their course data and statistics
     instructors_query = db.session.query(
@@ -238,10 +1057,14 @@ def instructors():
         func.avg(Evaluation.rating).label('avg_rating')
     ).outerjoin(Enrollment).outerjoin(Evaluation).group_by(Course.instructor).all()
     
+    # Get every instructor's courses in one query
+    courses_by_instructor = {}
+    for card in course_cards():
+        courses_by_instructor.setdefault(card.instructor, []).append(card)
+    
     instructors_data = []
     for instructor_info in instructors_query:
-        # Get courses for this instructor
-        instructor_courses = Course.query.filter_by(instructor=instructor_info.instructor).all()
+        instructor_courses = courses_by_instructor.get(instructor_info.instructor, [])
         
         instructors_data.append({
             'instructor': instructor_info.instructor,
@@ -254,6 +1077,7 @@ def instructors():
     return render_template('instructors.html', instructors_data=instructors_data)
 
 @app.route('/courses')
+@read_only
 def courses():
     # Get search and filter parameters
     search = request.args.get('search', '')
@@ -265,11 +1089,11 @@ def courses():
     
     # Build query with relationships
     query = db.session.query(
-        Course,
+        *course_card_columns(),
         func.avg(Evaluation.rating).label('avg_rating'),
         func.count(Evaluation.rating).label('rating_count'),
         func.count(Enrollment.id).label('enrollment_count')
-    ).outerjoin(Evaluation).outerjoin(Enrollment).group_by(Course.id)
+    ).select_from(Course).outerjoin(Evaluation).outerjoin(Enrollment).group_by(Course.id)
     
     if search:
         query = query.filter(
@@ -297,7 +1121,8 @@ def courses():
     else:
         query = query.order_by(Course.title.asc())
     
-    courses_data = query.all()
+    card_width = len(CourseCard._fields)
+    courses_data = [CourseListing(CourseCard(*row[:card_width]), *row[card_width:]) for row in query]
     
     # Get all instructors for filter dropdown
     instructors = db.session.query(Course.instructor).distinct().order_by(Course.instructor).all()
@@ -313,11 +1138,13 @@ def courses():
                          current_sort=sort_by)
 
 @app.route('/browse-courses')
+@read_only
 def browse_courses():
-    courses = Course.query.all()
+    courses = course_cards()
     return render_template('browse_courses.html', courses=courses)
 
 @app.route('/register', methods=['GET', 'POST'])
+@rate_limited('register', methods=['POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
@@ -337,6 +1164,7 @@ def register():
         hashed_password = hash_password(password)
         new_user = User(username=username, password=hashed_password, email=email)
         db.session.add(new_user)
+        record_metric('signups')
         db.session.commit()
         
         flash('Registration successful! Please login.')
@@ -345,6 +1173,7 @@ def register():
     return render_template('register.html')
 
 @app.route('/login', methods=['GET', 'POST'])
+@rate_limited('login', methods=['POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
@@ -376,9 +1205,10 @@ def dashboard():
     if session['role'] == 'admin':
         return redirect(url_for('admin_dashboard'))
     
-    # Get user's enrolled courses using relationships
-    user = User.query.get(session['user_id'])
-    enrollments = user.enrollments
+    # Get user's enrolled courses (with their descriptions) in one query
+    enrollments = Enrollment.query.filter_by(user_id=session['user_id']).options(
+        joinedload(Enrollment.course).undefer(Course.description)
+    ).order_by(Enrollment.enrolled_at).all()
     
     # Get recommended courses
     recommendations = get_recommendations(session['user_id'])
@@ -388,10 +1218,15 @@ def dashboard():
 @app.route('/admin')
 @require_admin
 def admin_dashboard():
-    # Get statistics using SQLAlchemy
-    total_users = User.query.count()
-    total_courses = Course.query.count()
-    total_enrollments = Enrollment.query.count()
+    # Get statistics from the analytics rollups instead of counting each table
+    totals = metric_totals()
+    total_users = int(totals.get('signups', 0))
+    total_courses = int(totals.get('courses', 0))
+    total_enrollments = int(totals.get('enrollments', 0))
+    total_revenue = round(totals.get('revenue', 0), 2)
+    
+    # Daily trends for the last 30 days
+    trends = {metric: metric_series(metric) for metric in ('signups', 'enrollments', 'evaluations', 'revenue')}
     
     # Get recent activities using relationships
     recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
@@ -401,9 +1236,29 @@ def admin_dashboard():
                          total_users=total_users,
                          total_courses=total_courses,
                          total_enrollments=total_enrollments,
+                         total_revenue=total_revenue,
+                         trends=trends,
                          recent_users=recent_users,
                          recent_evaluations=recent_evaluations)
 
+@app.route('/api/admin/analytics/<metric>')
+@require_admin
+def analytics_series(metric):
+    if metric not in rollup_sources():
+        return jsonify({'error': 'Unknown metric'}), 404
+    bucket_size = request.args.get('bucket', 'day')
+    if bucket_size not in ROLLUP_BUCKETS:
+        bucket_size = 'day'
+    periods = min(request.args.get('periods', 30, type=int), 24 * 90)
+    course_id = request.args.get('course_id', type=int)
+    
+    series = metric_series(metric, bucket_size, periods, course_id)
+    return jsonify({
+        'metric': metric,
+        'bucket': bucket_size,
+        'series': [{'bucket_start': start.isoformat(), 'value': value} for start, value in series]
+    })
+
 @app.route('/download/<int:file_id>')
 @require_login
 def download_file(file_id):
@@ -421,12 +1276,24 @@ def download_file(file_id):
         return redirect(url_for('course_detail', course_id=file_info.course_id))
     
     try:
-        return send_from_directory(app.config['UPLOAD_FOLDER'], file_info.filename, 
-                                 as_attachment=True, download_name=file_info.original_filename)
+        return redirect(storage.download_url(file_info.filename, file_info.original_filename))
     except FileNotFoundError:
         flash('File not found on server')
         return redirect(url_for('course_detail', course_id=file_info.course_id))
 
+@app.route('/files/<key>')
+def serve_signed_file(key):
+    # Local-storage download target: the signed URL is the authorization, so
+    # no session or database lookup is needed (Range requests are supported)
+    if not isinstance(storage, LocalStorage):
+        return jsonify({'error': 'Not found'}), 404
+    name = request.args.get('name', key)
+    expires = request.args.get('expires', 0, type=int)
+    signature = request.args.get('signature', '')
+    if expires < time.time() or not hmac.compare_digest(signature, sign_download(key, name, expires)):
+        return jsonify({'error': 'Download link invalid or expired'}), 403
+    return send_from_directory(storage.root, key, as_attachment=True, download_name=name)
+
 @app.route('/admin/courses/<int:course_id>/files')
 @require_admin
 def manage_course_files(course_id):
@@ -444,10 +1311,7 @@ def upload_course_files(course_id):
             filename = secure_filename(file.filename)
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
             unique_filename = timestamp + filename
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-            file.save(file_path)
-            
-            file_size = os.path.getsize(file_path)
+            file_size = storage.put(unique_filename, file.stream)
             file_type = filename.rsplit('.', 1)[1].lower()
             
             # Create CourseFile using SQLAlchemy
@@ -464,16 +1328,229 @@ def upload_course_files(course_id):
     flash('Files uploaded successfully!')
     return redirect(url_for('manage_course_files', course_id=course_id))
 
+# Resumable uploads
+def staging_path(upload_id):
+    return os.path.join(UPLOAD_STAGING_FOLDER, upload_id)
+
+@contextmanager
+def staging_lock(upload_id):
+    # Serialises writes to one session's staging file across threads and
+    # worker processes; whoever holds it must re-read the session's offset
+    with open(staging_path(upload_id) + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def remove_staging_files(upload_id):
+    for path in (staging_path(upload_id), staging_path(upload_id) + '.lock'):
+        if os.path.exists(path):
+            os.remove(path)
+
+def current_upload_offset(upload_id):
+    # Fresh read (not the identity map) of a session's committed offset
+    return db.session.query(UploadSession.offset).filter_by(id=upload_id).scalar()
+
+def expire_upload_sessions():
+    # Drop sessions that have not received a chunk within UPLOAD_SESSION_TTL
+    cutoff = datetime.utcnow() - app.config['UPLOAD_SESSION_TTL']
+    expired = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+    for upload in expired:
+        remove_staging_files(upload.id)
+        db.session.delete(upload)
+    db.session.commit()
+    return len(expired)
+
+def upload_status(upload_id, offset, total_size, updated_at):
+    # Built from plain values so callers never need to reload an entity a
+    # concurrent cancel or expiry may have deleted
+    return {
+        'upload_id': upload_id,
+        'offset': offset,
+        'size': total_size,
+        'chunk_size': app.config['UPLOAD_CHUNK_SIZE'],
+        'expires_at': (updated_at + app.config['UPLOAD_SESSION_TTL']).isoformat()
+    }
+
+@app.route('/admin/courses/<int:course_id>/uploads', methods=['POST'])
+@require_admin
+def create_upload_session(course_id):
+    Course.query.get_or_404(course_id)
+    data = request.get_json(silent=True) or request.form
+    filename = secure_filename(data.get('filename', ''))
+    try:
+        total_size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        total_size = 0
+    
+    if not filename or not allowed_file(filename):
+        return jsonify({'error': 'File type not allowed'}), 400
+    if total_size <= 0 or total_size > app.config['UPLOAD_MAX_FILE_SIZE']:
+        return jsonify({'error': 'Invalid file size'}), 400
+    
+    expire_upload_sessions()
+    
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        course_id=course_id,
+        user_id=session['user_id'],
+        original_filename=filename,
+        total_size=total_size,
+        updated_at=datetime.utcnow()
+    )
+    open(staging_path(upload.id), 'wb').close()
+    status = upload_status(upload.id, 0, total_size, upload.updated_at)
+    db.session.add(upload)
+    db.session.commit()
+    
+    response = jsonify(status)
+    response.status_code = 201
+    response.headers['Location'] = url_for('upload_offset', upload_id=status['upload_id'])
+    return response
+
+@app.route('/admin/uploads/<upload_id>', methods=['GET', 'HEAD'])
+@require_admin
+def upload_offset(upload_id):
+    upload = UploadSession.query.get_or_404(upload_id)
+    response = jsonify(upload_status(upload_id, upload.offset, upload.total_size, upload.updated_at))
+    response.headers['Upload-Offset'] = str(upload.offset)
+    return response
+
+@app.route('/admin/uploads/<upload_id>', methods=['PUT'])
+@require_admin
+def upload_chunk(upload_id):
+    upload = UploadSession.query.get_or_404(upload_id)
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        offset = request.args.get('offset', type=int)
+    checksum = request.headers.get('Upload-Checksum', '').lower()
+    length = request.content_length
+    # Copied out because the commits below expire the entity, and a concurrent
+    # cancel or expiry may delete its row
+    current_offset, total_size = upload.offset, upload.total_size
+    
+    # A client resuming after a dropped connection asks for the offset and
+    # continues from there; anything else is a conflict
+    if offset != current_offset:
+        response = jsonify({'error': 'Offset mismatch', 'offset': current_offset})
+        response.status_code = 409
+        response.headers['Upload-Offset'] = str(current_offset)
+        return response
+    if not checksum:
+        return jsonify({'error': 'Upload-Checksum header required'}), 400
+    if length is None or length > app.config['UPLOAD_MAX_CHUNK_SIZE'] or offset + length > total_size:
+        return jsonify({'error': 'Invalid chunk length'}), 400
+    
+    # Stream the chunk into its own temp file, hashing as we go. The staging
+    # file is not touched until the chunk is verified and the offset claimed.
+    chunk_path = f'{staging_path(upload_id)}.{uuid.uuid4().hex}.chunk'
+    try:
+        digest = hashlib.sha256()
+        written = 0
+        with open(chunk_path, 'wb') as chunk:
+            while True:
+                block = request.stream.read(1024 * 1024)
+                if not block:
+                    break
+                digest.update(block)
+                chunk.write(block)
+                written += len(block)
+        if written != length or digest.hexdigest() != checksum:
+            return jsonify({'error': 'Chunk checksum mismatch', 'offset': offset}), 422
+        
+        db.session.commit()  # end the read transaction so the offset below is current
+        with staging_lock(upload_id):
+            current_offset = current_upload_offset(upload_id)
+            if current_offset is None:
+                return jsonify({'error': 'Upload session not found'}), 404
+            if current_offset != offset:
+                # Another request for this offset got here first
+                return jsonify({'error': 'Offset mismatch', 'offset': current_offset}), 409
+            
+            with open(chunk_path, 'rb') as chunk, open(staging_path(upload_id), 'r+b') as staging:
+                staging.seek(offset)
+                shutil.copyfileobj(chunk, staging, 1024 * 1024)
+                staging.truncate(offset + written)
+            
+            updated_at = datetime.utcnow()
+            UploadSession.query.filter_by(id=upload_id, offset=offset).update({
+                'offset': offset + written,
+                'chunk_count': UploadSession.chunk_count + 1,
+                'updated_at': updated_at
+            })
+            db.session.commit()
+            current_offset = current_upload_offset(upload_id)
+    finally:
+        if os.path.exists(chunk_path):
+            os.remove(chunk_path)
+    
+    if current_offset is None:
+        return jsonify({'error': 'Upload session not found'}), 404
+    response = jsonify(upload_status(upload_id, current_offset, total_size, updated_at))
+    response.headers['Upload-Offset'] = str(current_offset)
+    return response
+
+@app.route('/admin/uploads/<upload_id>/finalize', methods=['POST'])
+@require_admin
+def finalize_upload(upload_id):
+    upload = UploadSession.query.get_or_404(upload_id)
+    course_id, original_filename, total_size = upload.course_id, upload.original_filename, upload.total_size
+    db.session.commit()
+    
+    with staging_lock(upload_id):
+        offset = current_upload_offset(upload_id)
+        if offset is None:
+            return jsonify({'error': 'Upload session not found'}), 404
+        if offset != total_size:
+            return jsonify({'error': 'Upload incomplete', 'offset': offset}), 409
+        staged_size = os.path.getsize(staging_path(upload_id))
+        if staged_size != total_size:
+            app.logger.error('Upload %s: staging file has %d of %d bytes', upload_id, staged_size, total_size)
+            return jsonify({'error': 'Staged data does not match upload size', 'offset': offset}), 409
+        
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
+        unique_filename = timestamp + original_filename
+        storage.put_file(unique_filename, staging_path(upload_id))
+        
+        course_file = CourseFile(
+            course_id=course_id,
+            filename=unique_filename,
+            original_filename=original_filename,
+            file_type=original_filename.rsplit('.', 1)[1].lower(),
+            file_size=total_size
+        )
+        db.session.add(course_file)
+        UploadSession.query.filter_by(id=upload_id).delete()
+        db.session.commit()
+    remove_staging_files(upload_id)
+    
+    return jsonify({'file_id': course_file.id, 'filename': unique_filename, 'size': total_size})
+
+@app.route('/admin/uploads/<upload_id>', methods=['DELETE'])
+@require_admin
+def cancel_upload(upload_id):
+    UploadSession.query.get_or_404(upload_id)
+    db.session.commit()
+    with staging_lock(upload_id):
+        UploadSession.query.filter_by(id=upload_id).delete()
+        db.session.commit()
+    remove_staging_files(upload_id)
+    return '', 204
+
+@app.cli.command('expire-uploads')
+def expire_uploads_command():
+    """Remove abandoned resumable upload sessions and their staging files."""
+    print(f'Expired {expire_upload_sessions()} upload session(s)')
+
 @app.route('/admin/delete-file/<int:file_id>')
 @require_admin
 def delete_course_file(file_id):
     file_info = CourseFile.query.get_or_404(file_id)
     course_id = file_info.course_id
     
-    # Delete from filesystem
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], file_info.filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    # Delete from storage
+    storage.delete(file_info.filename)
     
     # Delete from database
     db.session.delete(file_info)
@@ -486,8 +1563,7 @@ def delete_course_file(file_id):
 @require_admin
 def admin_courses():
     # Get courses managed by current admin
-    admin_user = User.query.get(session['user_id'])
-    courses = admin_user.managed_courses  # Using relationship
+    courses = course_cards(Course.manager_id == session['user_id'])
     return render_template('admin_courses.html', courses=courses)
 
 @app.route('/admin/courses/add', methods=['GET', 'POST'])
@@ -513,6 +1589,7 @@ def add_course():
         )
         db.session.add(course)
         db.session.flush()  # To get the course ID
+        record_metric('courses')
         
         # Handle file uploads
         uploaded_files = request.files.getlist('course_files')
@@ -521,10 +1598,7 @@ def add_course():
                 filename = secure_filename(file.filename)
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
                 unique_filename = timestamp + filename
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                file.save(file_path)
-                
-                file_size = os.path.getsize(file_path)
+                file_size = storage.put(unique_filename, file.stream)
                 file_type = filename.rsplit('.', 1)[1].lower()
                 
                 course_file = CourseFile(
@@ -545,7 +1619,7 @@ def add_course():
 @app.route('/admin/courses/edit/<int:course_id>', methods=['GET', 'POST'])
 @require_admin
 def edit_course(course_id):
-    course = Course.query.get_or_404(course_id)
+    course = Course.query.options(undefer_group('body')).get_or_404(course_id)
     
     # Check if current admin manages this course
     if course.manager_id != session['user_id'] and session['role'] != 'admin':
@@ -566,6 +1640,19 @@ def edit_course(course_id):
     
     return render_template('edit_course.html', course=course)
 
+@app.route('/admin/courses/<int:course_id>/enroll-cohort', methods=['POST'])
+@require_admin
+def enroll_cohort(course_id):
+    Course.query.get_or_404(course_id)
+    usernames = [name.strip() for name in request.form.get('usernames', '').replace(',', '\n').splitlines() if name.strip()]
+    user_ids = [row.id for row in db.session.query(User.id).filter(User.username.in_(usernames)).all()]
+    
+    enrolled = enroll_users(user_ids, course_id)
+    db.session.commit()
+    
+    flash(f'Enrolled {enrolled} new student(s); {len(usernames) - enrolled} skipped')
+    return redirect(url_for('admin_courses'))
+
 @app.route('/enroll/<int:course_id>')
 @require_login
 def enroll(course_id):
@@ -621,33 +1708,69 @@ def payment_page(course_id):
     if course.price == 'Free':
         return redirect(url_for('process_enrollment', course_id=course_id))
     
-    course_price = float(course.price.replace('$', ''))
-    platform_fee = 2.99
-    total_price = round(course_price + platform_fee, 2)
+    try:
+        total_price = calculate_total_price(course)
+    except ValueError:
+        flash('This course cannot be purchased right now')
+        return redirect(url_for('course_detail', course_id=course_id))
     
+    # Key sent back with the form so double submits and retries are charged once
     return render_template('payment.html', 
                          course=course,
-                         total_price=total_price)
+                         total_price=total_price,
+                         idempotency_key=uuid.uuid4().hex)
 
 @app.route('/process-payment/<int:course_id>', methods=['POST'])
 @require_login
+@rate_limited('enrollment')
 def process_payment(course_id):
     course = Course.query.get_or_404(course_id)
     
-    # Check if already enrolled
-    existing = Enrollment.query.filter_by(
-        user_id=session['user_id'], 
-        course_id=course_id
-    ).first()
-    
-    if existing:
-        flash('You are already enrolled in this course')
-        return redirect(url_for('course_detail', course_id=course_id))
-    
     # Get payment details from form
     payment_method = request.form.get('payment_method', 'card')
     card_number = request.form.get('card_number', '')
     cardholder_name = request.form.get('cardholder_name', '')
+    idempotency_key = (request.headers.get('Idempotency-Key')
+                       or request.form.get('idempotency_key', ''))[:64]
+    
+    # Free courses need no payment
+    if course.price == 'Free':
+        return redirect(url_for('process_enrollment', course_id=course_id))
+    
+    try:
+        amount = calculate_total_price(course)
+    except ValueError:
+        flash('This course cannot be purchased right now')
+        return redirect(url_for('course_detail', course_id=course_id))
+    
+    # Without a key a retry cannot be told apart from a new purchase
+    if not idempotency_key:
+        flash('Your payment form has expired. Please try again.')
+        return redirect(url_for('payment_page', course_id=course_id))
+    
+    attempt, created = start_payment_attempt(
+        idempotency_key, session['user_id'], course_id, amount, payment_method
+    )
+    db.session.commit()
+    
+    if not created:
+        # Retry or double submit of a payment we have already seen
+        if attempt.user_id != session['user_id'] or attempt.course_id != course_id:
+            flash('Invalid payment request')
+            return redirect(url_for('payment_page', course_id=course_id))
+        if attempt.status == 'succeeded':
+            return redirect(url_for('enrollment_success', course_id=course_id))
+        if attempt.status == 'pending':
+            flash('Your payment is already being processed')
+            return redirect(url_for('course_detail', course_id=course_id))
+        flash('Payment failed. Please try again.')
+        return redirect(url_for('payment_page', course_id=course_id))
+    
+    if is_enrolled(session['user_id'], course_id):
+        attempt.status = 'failed'
+        db.session.commit()
+        flash('You are already enrolled in this course')
+        return redirect(url_for('course_detail', course_id=course_id))
     
     # Simulate payment processing
     # In a real application, you would integrate with a payment processor
@@ -657,37 +1780,40 @@ def process_payment(course_id):
     payment_successful = True
     
     if payment_successful:
-        # Create enrollment
-        enrollment = Enrollment(user_id=session['user_id'], course_id=course_id)
-        db.session.add(enrollment)
+        # Create enrollment; only the request that inserts it is charged
+        if not enroll_user(session['user_id'], course_id):
+            attempt.status = 'failed'
+            db.session.commit()
+            flash('You are already enrolled in this course')
+            return redirect(url_for('course_detail', course_id=course_id))
+        
+        attempt.status = 'succeeded'
+        record_metric('revenue', attempt.amount, course_id=course_id)
         db.session.commit()
         
         flash('Payment successful! You are now enrolled in the course.')
         return redirect(url_for('enrollment_success', course_id=course_id))
     else:
+        attempt.status = 'failed'
+        db.session.commit()
         flash('Payment failed. Please try again.')
         return redirect(url_for('payment_page', course_id=course_id))
 
 @app.route('/process-enrollment/<int:course_id>')
 @require_login
+@rate_limited('enrollment')
 def process_enrollment(course_id):
     course = Course.query.get_or_404(course_id)
     
-    # Check if already enrolled
-    existing = Enrollment.query.filter_by(
-        user_id=session['user_id'], 
-        course_id=course_id
-    ).first()
+    # Create enrollment for free courses; a concurrent or repeated request
+    # hits the unique index and inserts nothing
+    created = enroll_user(session['user_id'], course_id)
+    db.session.commit()
     
-    if existing:
+    if not created:
         flash('You are already enrolled in this course')
         return redirect(url_for('course_detail', course_id=course_id))
     
-    # Create enrollment for free courses
-    enrollment = Enrollment(user_id=session['user_id'], course_id=course_id)
-    db.session.add(enrollment)
-    db.session.commit()
-    
     flash('Successfully enrolled in course!')
     return redirect(url_for('enrollment_success', course_id=course_id))
 
@@ -717,7 +1843,7 @@ def enrollment_success(course_id):
 @app.route('/course/<int:course_id>')
 @require_login
 def course_detail(course_id):
-    course = Course.query.get_or_404(course_id)
+    course = Course.query.options(undefer_group('body')).get_or_404(course_id)
     
     # Check if user is enrolled using relationships
     enrollment = Enrollment.query.filter_by(
@@ -753,9 +1879,11 @@ def evaluate_course(course_id):
     ).first()
     
     if existing:
+        evaluated_at = existing.created_at
         existing.rating = rating
         existing.comment = comment
         existing.created_at = datetime.utcnow()
+        move_metric('evaluations', course_id, evaluated_at, existing.created_at)
     else:
         evaluation = Evaluation(
             user_id=session['user_id'],
@@ -764,6 +1892,7 @@ def evaluate_course(course_id):
             comment=comment
         )
         db.session.add(evaluation)
+        record_metric('evaluations', course_id=course_id)
     
     db.session.commit()
     flash('Thank you for your evaluation!')
@@ -774,10 +1903,10 @@ def get_recommendations(user_id):
     enrolled_course_ids = db.session.query(Enrollment.course_id).filter_by(user_id=user_id).subquery()
     
     recommendations = db.session.query(
-        Course,
+        *course_card_columns(),
         func.avg(Evaluation.rating).label('avg_rating'),
         func.count(Evaluation.rating).label('rating_count')
-    ).outerjoin(Evaluation).filter(
+    ).select_from(Course).outerjoin(Evaluation).filter(
         ~Course.id.in_(enrolled_course_ids)
     ).group_by(Course.id).having(
         func.count(Evaluation.rating) > 0
@@ -786,9 +1915,11 @@ def get_recommendations(user_id):
         func.count(Evaluation.rating).desc()
     ).limit(3).all()
     
-    return recommendations
+    card_width = len(CourseCard._fields)
+    return [CourseRecommendation(CourseCard(*row[:card_width]), *row[card_width:]) for row in recommendations]
 
 @app.route('/api/course-stats/<int:course_id>')
+@read_only
 def course_stats(course_id):
     # Get stats using relationships and aggregations
     stats = db.session.query(
@@ -805,5 +1936,21 @@ def course_stats(course_id):
         'total_enrollments': stats.total_enrollments or 0
     })
 
+@app.route('/api/rate-limit-stats')
+@require_admin
+def rate_limit_stats():
+    with rate_limit_counters_lock:
+        counters = dict(rate_limit_counters)
+    return jsonify({
+        'counters': counters,
+        'writes_in_flight': write_limiter.in_flight,
+        'max_concurrent_writes': app.config['MAX_CONCURRENT_WRITES'],
+        'backend': app.config['RATELIMIT_BACKEND']
+    })
+
 if __name__ == '__main__':
+    # The debug reloader runs this module in a watcher process and a serving
+    # child; only the child (WERKZEUG_RUN_MAIN set) refreshes the replica
+    if replica_refresher and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        replica_refresher.start()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,73 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+# main.py configures itself from the environment at import time, so point it
+# at a throwaway database and upload folder before importing it
+TEST_DIR = tempfile.mkdtemp(prefix='academy-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(TEST_DIR, 'academy.db')
+os.environ['UPLOAD_FOLDER'] = os.path.join(TEST_DIR, 'uploads')
+# A second sqlite file stands in for the read replica, refreshed by the tests
+os.environ['READ_DATABASE_URI'] = 'sqlite:///' + os.path.join(TEST_DIR, 'replica.db')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+main.replica_refresher.refresh()
+
+
+@pytest.fixture
+def app(monkeypatch):
+    # Fresh, generous limits so tests are not throttled by each other
+    monkeypatch.setitem(main.app.config, 'RATE_LIMITS', {
+        'login': (1000, 1),
+        'register': (1000, 1),
+        'enrollment': (1000, 1),
+    })
+    monkeypatch.setattr(main, 'rate_limiter', main.RateLimiter(main.MemoryRateLimitBackend()))
+    monkeypatch.setattr(main, 'write_limiter', main.ConcurrencyLimiter(100))
+    return main.app
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(role='student'):
+        name = f'user_{uuid.uuid4().hex[:12]}'
+        with app.app_context():
+            user = main.User(username=name, password=main.hash_password('secret'),
+                             email=f'{name}@example.com', role=role)
+            main.db.session.add(user)
+            main.db.session.commit()
+            return user.id, name
+    return make_user
+
+
+@pytest.fixture
+def make_course(app):
+    def make_course(price='$10', **fields):
+        with app.app_context():
+            course = main.Course(title=fields.pop('title', f'Course {uuid.uuid4().hex[:8]}'),
+                                 description='A course',
+                                 instructor=fields.pop('instructor', 'Test Instructor'),
+                                 duration='1 hour', price=price, content='Content', **fields)
+            main.db.session.add(course)
+            main.db.session.commit()
+            return course.id
+    return make_course
+
+
+@pytest.fixture
+def login(app):
+    def login(user, role='student'):
+        user_id, username = user
+        client = app.test_client()
+        with client.session_transaction() as s:
+            s['user_id'] = user_id
+            s['username'] = username
+            s['role'] = role
+        return client
+    return login
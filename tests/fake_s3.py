@@ -0,0 +1,89 @@
+"""In-process stand-in for a boto3 S3 client, covering the calls S3Storage makes."""
+import hashlib
+import threading
+import uuid
+from urllib.parse import urlencode
+
+
+class FakeBody:
+    def __init__(self, data):
+        self.data = data
+
+    def iter_chunks(self, chunk_size=1024):
+        for i in range(0, len(self.data), chunk_size):
+            yield self.data[i:i + chunk_size]
+
+
+class ClientError(Exception):
+    def __init__(self, code, operation_name):
+        super().__init__(f'An error occurred ({code}) when calling the {operation_name} operation')
+        self.response = {'Error': {'Code': code}}
+
+
+class FakeS3Client:
+    class exceptions:
+        ClientError = ClientError
+
+        class NoSuchKey(Exception):
+            pass
+
+        class NoSuchUpload(Exception):
+            pass
+
+    def __init__(self, endpoint='https://s3.local.test'):
+        self.endpoint = endpoint
+        self.objects = {}
+        self.uploads = {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body):
+        self.calls.append('put_object')
+        self.objects[(Bucket, Key)] = bytes(Body)
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.calls.append('create_multipart_upload')
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self.lock:
+            self.calls.append('upload_part')
+            if UploadId not in self.uploads:
+                raise self.exceptions.NoSuchUpload(UploadId)
+            self.uploads[UploadId][PartNumber] = bytes(Body)
+        return {'ETag': hashlib.md5(Body).hexdigest()}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append('complete_multipart_upload')
+        parts = self.uploads.pop(UploadId)
+        numbers = [part['PartNumber'] for part in MultipartUpload['Parts']]
+        assert numbers == sorted(numbers) == list(range(1, len(parts) + 1))
+        for part in MultipartUpload['Parts']:
+            assert part['ETag'] == hashlib.md5(parts[part['PartNumber']]).hexdigest()
+        self.objects[(Bucket, Key)] = b''.join(parts[number] for number in numbers)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.calls.append('abort_multipart_upload')
+        self.uploads.pop(UploadId, None)
+
+    def get_object(self, Bucket, Key, Range=None):
+        if (Bucket, Key) not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        data = self.objects[(Bucket, Key)]
+        if Range:
+            start, end = Range[len('bytes='):].split('-')
+            if int(start) >= len(data):
+                raise ClientError('InvalidRange', 'GetObject')
+            data = data[int(start):int(end) + 1 if end else None]
+        return {'Body': FakeBody(data)}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn):
+        query = {'X-Amz-Expires': ExpiresIn}
+        if 'ResponseContentDisposition' in Params:
+            query['response-content-disposition'] = Params['ResponseContentDisposition']
+        return f"{self.endpoint}/{Params['Bucket']}/{Params['Key']}?{urlencode(query)}"
@@ -0,0 +1,145 @@
+import threading
+
+from sqlalchemy import event
+
+import main
+
+
+def parallel(count, fn):
+    results = []
+    barrier = threading.Barrier(count)
+
+    def run():
+        barrier.wait()
+        results.append(fn())
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def enrollment_count(app, user_id, course_id):
+    with app.app_context():
+        return main.Enrollment.query.filter_by(user_id=user_id, course_id=course_id).count()
+
+
+def test_parallel_enroll_creates_one_enrollment(app, make_user, make_course, login):
+    user = make_user()
+    course_id = make_course(price='Free')
+
+    statuses = parallel(16, lambda: login(user).get(f'/process-enrollment/{course_id}').status_code)
+
+    assert statuses == [302] * 16
+    assert enrollment_count(app, user[0], course_id) == 1
+
+
+def test_bulk_enroll_skips_existing(app, make_user, make_course):
+    course_id = make_course()
+    user_ids = [make_user()[0] for _ in range(3)]
+
+    with app.app_context():
+        assert main.enroll_user(user_ids[0], course_id)
+        assert main.enroll_users(user_ids + user_ids, course_id) == 2
+        assert not main.enroll_user(user_ids[0], course_id)
+        main.db.session.commit()
+
+    assert all(enrollment_count(app, user_id, course_id) == 1 for user_id in user_ids)
+
+
+def test_payment_double_submit_is_charged_once(app, make_user, make_course, login):
+    user = make_user()
+    course_id = make_course(price='$20')
+
+    responses = parallel(8, lambda: login(user).post(
+        f'/process-payment/{course_id}', data={'idempotency_key': 'double-submit-key'}))
+
+    assert all(r.status_code == 302 for r in responses)
+    assert enrollment_count(app, user[0], course_id) == 1
+    with app.app_context():
+        attempts = main.PaymentAttempt.query.filter_by(user_id=user[0], course_id=course_id).all()
+        revenue = main.db.session.query(main.func.sum(main.AnalyticsRollup.value)).filter_by(
+            metric='revenue', bucket_size='day', course_id=course_id).scalar()
+    assert [(a.idempotency_key, a.status) for a in attempts] == [('double-submit-key', 'succeeded')]
+    assert revenue == 22.99
+
+
+def test_payment_with_new_key_after_enrollment_is_not_charged(app, make_user, make_course, login):
+    user = make_user()
+    course_id = make_course(price='$20')
+    client = login(user)
+
+    client.post(f'/process-payment/{course_id}', data={'idempotency_key': 'first'})
+    response = client.post(f'/process-payment/{course_id}', data={'idempotency_key': 'second'})
+
+    assert response.location.endswith(f'/course/{course_id}')
+    with app.app_context():
+        statuses = {a.idempotency_key: a.status
+                    for a in main.PaymentAttempt.query.filter_by(course_id=course_id)}
+    assert statuses == {'first': 'succeeded', 'second': 'failed'}
+
+
+def test_payment_without_key_is_rejected(app, make_user, make_course, login):
+    user = make_user()
+    course_id = make_course(price='$20')
+
+    response = login(user).post(f'/process-payment/{course_id}')
+
+    assert response.location.endswith(f'/payment/{course_id}')
+    assert enrollment_count(app, user[0], course_id) == 0
+    with app.app_context():
+        assert main.PaymentAttempt.query.filter_by(course_id=course_id).count() == 0
+
+
+def test_payment_for_free_course_enrolls_without_charging(app, make_user, make_course, login):
+    user = make_user()
+    course_id = make_course(price='Free')
+    client = login(user)
+
+    response = client.post(f'/process-payment/{course_id}', data={'idempotency_key': 'free'})
+    assert response.location.endswith(f'/process-enrollment/{course_id}')
+    client.get(response.location)
+
+    assert enrollment_count(app, user[0], course_id) == 1
+    with app.app_context():
+        assert main.PaymentAttempt.query.filter_by(course_id=course_id).count() == 0
+
+
+def test_payment_page_renders_idempotency_key(app, make_user, make_course, login):
+    course_id = make_course(price='$15')
+
+    response = login(make_user()).get(f'/payment/{course_id}')
+
+    assert response.status_code == 200
+    assert b'name="idempotency_key"' in response.data
+
+
+def test_init_db_adds_unique_index_to_existing_database(app, make_user, make_course):
+    user_id, course_id = make_user()[0], make_course()
+    with app.app_context():
+        # A database from before the index, with a duplicate enrollment
+        main.db.session.execute(main.db.text('DROP INDEX uq_enrollments_user_course'))
+        for _ in range(2):
+            main.db.session.add(main.Enrollment(user_id=user_id, course_id=course_id))
+        main.db.session.commit()
+
+    main.init_db()
+    assert enrollment_count(app, user_id, course_id) == 1
+
+    # Once the index exists, later startups leave the table alone
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = main.db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        main.init_db()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert statements
+    assert not any('enrollments' in sql and sql.lstrip().startswith(('DELETE', 'CREATE UNIQUE')) for sql in statements)
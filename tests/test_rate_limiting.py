@@ -0,0 +1,104 @@
+import sqlite3
+
+import pytest
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import main
+
+
+@pytest.fixture
+def strict_login_limit(app, monkeypatch):
+    monkeypatch.setitem(app.config['RATE_LIMITS'], 'login', (2, 60))
+
+
+def login_as(client, username, **kwargs):
+    return client.post('/login', data={'username': username, 'password': 'secret'}, **kwargs)
+
+
+def test_login_is_throttled_per_ip_with_retry_after(app, make_user, strict_login_limit):
+    client = app.test_client()
+
+    statuses = [login_as(client, make_user()[1]).status_code for _ in range(3)]
+
+    assert statuses == [302, 302, 429]
+    response = login_as(client, make_user()[1])
+    assert int(response.headers['Retry-After']) > 0
+
+
+def test_login_is_throttled_per_username_across_ips(app, make_user, strict_login_limit):
+    _, username = make_user()
+    client = app.test_client()
+
+    statuses = [login_as(client, username, environ_base={'REMOTE_ADDR': f'10.0.0.{i}'}).status_code
+                for i in range(3)]
+
+    assert statuses == [302, 302, 429]
+
+
+def test_forwarded_client_ip_is_used_behind_trusted_proxy(app, make_user, strict_login_limit, monkeypatch):
+    monkeypatch.setattr(app, 'wsgi_app', ProxyFix(app.wsgi_app, x_for=1))
+    client = app.test_client()
+
+    # Same proxy address, different real clients: each gets its own bucket
+    statuses = [login_as(client, make_user()[1], headers={'X-Forwarded-For': f'203.0.113.{i}'}).status_code
+                for i in range(5)]
+
+    assert statuses == [302] * 5
+
+
+def test_memory_backend_prunes_refilled_buckets():
+    backend = main.MemoryRateLimitBackend(prune_interval=10)
+    for i in range(100):
+        backend.take(f'login:user:{i}', rate=1, burst=5, now=0)
+
+    # One token used per bucket: all are full again after 1 second
+    backend.take('login:user:new', rate=1, burst=5, now=20)
+
+    assert list(backend.buckets) == ['login:user:new']
+
+
+def test_memory_backend_is_bounded():
+    backend = main.MemoryRateLimitBackend(max_buckets=10)
+    for i in range(50):
+        backend.take(f'login:user:{i}', rate=1, burst=5, now=i / 1000)
+
+    assert len(backend.buckets) == 10
+    assert 'login:user:49' in backend.buckets
+
+
+def test_sqlite_backend_shares_and_prunes_buckets(tmp_path):
+    path = str(tmp_path / 'ratelimit.db')
+    first = main.SQLiteRateLimitBackend(path, prune_interval=10)
+    second = main.SQLiteRateLimitBackend(path, prune_interval=10)
+
+    assert first.take('k', rate=1, burst=1, now=100)[0]
+    assert not second.take('k', rate=1, burst=1, now=100)[0]
+
+    second.take('other', rate=1, burst=1, now=200)
+    keys = [row[0] for row in sqlite3.connect(path).execute('SELECT key FROM rate_limit_buckets')]
+    assert keys == ['other']
+
+
+def test_sqlite_backend_contention_raises_busy(tmp_path):
+    path = str(tmp_path / 'ratelimit.db')
+    backend = main.SQLiteRateLimitBackend(path, timeout=0.05)
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute('BEGIN IMMEDIATE')
+    try:
+        with pytest.raises(main.RateLimiterBusy):
+            backend.take('k', rate=1, burst=1, now=0)
+    finally:
+        holder.execute('ROLLBACK')
+
+
+def test_contended_limiter_sheds_with_503(app, make_user, monkeypatch):
+    class BusyBackend:
+        def take(self, key, rate, burst, now):
+            raise main.RateLimiterBusy()
+
+    monkeypatch.setattr(main, 'rate_limiter', main.RateLimiter(BusyBackend()))
+
+    response = login_as(app.test_client(), make_user()[1])
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
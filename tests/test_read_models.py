@@ -0,0 +1,98 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import main
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """Capture render_template calls, touching every card field like a template would."""
+    captured = {}
+
+    def render_template(name, **context):
+        captured['name'] = name
+        captured['context'] = context
+        with count_queries() as queries:
+            touch(context)
+        captured['template_queries'] = queries
+        return ''
+
+    monkeypatch.setattr(main, 'render_template', render_template)
+    return captured
+
+
+class count_queries:
+    def __enter__(self):
+        self.statements = []
+        event.listen(Engine, 'before_cursor_execute', self.record)
+        return self.statements
+
+    def __exit__(self, *exc):
+        event.remove(Engine, 'before_cursor_execute', self.record)
+
+    def record(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+
+def touch(value):
+    if isinstance(value, dict):
+        for item in value.values():
+            touch(item)
+    elif isinstance(value, (list, tuple)) and not hasattr(value, '_fields'):
+        for item in value:
+            touch(item)
+    elif isinstance(value, main.Enrollment):
+        touch(value.course)
+    elif isinstance(value, (main.CourseCard, main.Course)):
+        value.title, value.description, value.price
+
+
+def test_list_views_render_projections(app, rendered, make_user, login):
+    client = login(make_user(role='admin'), role='admin')
+
+    for url in ['/', '/browse-courses', '/admin/courses']:
+        client.get(url)
+        courses = rendered['context']['courses']
+        assert all(isinstance(course, main.CourseCard) for course in courses)
+
+    client.get('/courses')
+    assert all(isinstance(row.Course, main.CourseCard) for row in rendered['context']['courses_data'])
+
+
+def test_instructors_loads_courses_in_one_query(app, rendered, make_course):
+    for _ in range(3):
+        make_course(instructor='Prolific Instructor')
+    main.replica_refresher.refresh()  # /instructors reads from the replica
+
+    with count_queries() as queries:
+        app.test_client().get('/instructors')
+
+    data = {row['instructor']: row for row in rendered['context']['instructors_data']}
+    assert len(data['Prolific Instructor']['courses']) == 3
+    assert all(isinstance(c, main.CourseCard) for c in data['Prolific Instructor']['courses'])
+    assert len(queries) == 2
+    assert rendered['template_queries'] == []
+
+
+def test_dashboard_renders_without_per_row_queries(app, rendered, make_user, make_course, login):
+    user = make_user()
+    course_ids = [make_course(price='Free') for _ in range(3)]
+    with app.app_context():
+        for course_id in course_ids:
+            main.enroll_user(user[0], course_id)
+        main.db.session.commit()
+
+    login(user).get('/dashboard')
+
+    assert len(rendered['context']['enrollments']) == 3
+    assert all(isinstance(r.Course, main.CourseCard) for r in rendered['context']['recommendations'])
+    assert rendered['template_queries'] == []
+
+
+def test_course_content_is_deferred(app, make_course):
+    course_id = make_course()
+    with app.app_context():
+        course = main.db.session.get(main.Course, course_id)
+        assert 'content' not in course.__dict__
+        assert 'description' not in course.__dict__
@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def refresher(app):
+    main.replica_refresher.refresh()
+    return main.replica_refresher
+
+
+def enrollments_seen_by(client, course_id):
+    response = client.get(f'/api/course-stats/{course_id}')
+    assert response.status_code == 200
+    return response.json['total_enrollments']
+
+
+def test_refresher_is_not_started_on_import(refresher):
+    assert refresher.thread is None
+    assert 'replica-refresher' not in [t.name for t in threading.enumerate()]
+
+
+def test_consistency_window(app, refresher, make_user, make_course, login):
+    course_id = make_course(price='Free')
+    refresher.refresh()
+    writer = login(make_user())
+    reader = login(make_user())
+
+    writer.get(f'/process-enrollment/{course_id}')
+
+    # The writer reads its own write from the primary...
+    assert enrollments_seen_by(writer, course_id) == 1
+    # ...while everyone else reads the replica, which has not caught up yet
+    assert enrollments_seen_by(reader, course_id) == 0
+
+    refresher.refresh()
+    assert enrollments_seen_by(reader, course_id) == 1
+
+
+def test_writer_returns_to_replica_after_window(app, refresher, make_user, make_course, login):
+    course_id = make_course(price='Free')
+    refresher.refresh()
+    writer = login(make_user())
+
+    writer.get(f'/process-enrollment/{course_id}')
+    with writer.session_transaction() as s:
+        s['last_write_at'] = time.time() - app.config['READ_YOUR_WRITES_SECONDS'] - 1
+
+    assert enrollments_seen_by(writer, course_id) == 0
+
+
+def test_reads_do_not_make_the_session_sticky(app, refresher, make_course, make_user, login):
+    course_id = make_course()
+    reader = login(make_user())
+
+    enrollments_seen_by(reader, course_id)
+
+    with reader.session_transaction() as s:
+        assert 'last_write_at' not in s
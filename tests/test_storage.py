@@ -0,0 +1,155 @@
+import io
+import os
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import main
+from fake_s3 import FakeS3Client
+
+PART_SIZE = 5 * 1024 * 1024
+
+
+@pytest.fixture(params=['local', 's3'])
+def storage(request, app, tmp_path):
+    if request.param == 'local':
+        return main.LocalStorage(str(tmp_path / 'files'))
+    return main.S3Storage('course-files', client=FakeS3Client(), part_size=PART_SIZE, max_workers=4)
+
+
+def read(storage, key, start=0, end=None):
+    return b''.join(storage.get(key, start, end))
+
+
+def test_storage_is_abstract():
+    with pytest.raises(TypeError):
+        main.Storage()
+
+
+@pytest.mark.parametrize('size', [0, 1000, 2 * PART_SIZE + 123])
+def test_put_and_get_stream(storage, size):
+    data = os.urandom(size)
+
+    assert storage.put('video.mp4', io.BytesIO(data)) == size
+    assert read(storage, 'video.mp4') == data
+
+
+def test_put_file_moves_local_file(storage, tmp_path):
+    data = os.urandom(3 * PART_SIZE + 7)
+    path = tmp_path / 'staged'
+    path.write_bytes(data)
+
+    assert storage.put_file('lecture.mp4', str(path)) == len(data)
+    assert not path.exists()
+    assert read(storage, 'lecture.mp4') == data
+
+
+@pytest.mark.parametrize('start,end', [(0, 0), (10, 19), (PART_SIZE - 5, PART_SIZE + 5), (100, None)])
+def test_ranged_get(storage, start, end):
+    data = os.urandom(PART_SIZE + 1000)
+    storage.put('notes.pdf', io.BytesIO(data))
+
+    assert read(storage, 'notes.pdf', start, end) == data[start:None if end is None else end + 1]
+
+
+@pytest.mark.parametrize('start,end', [(1000, None), (1000, 1999), (5000, 6000)])
+def test_ranged_get_past_end_is_empty(storage, start, end):
+    storage.put('notes.pdf', io.BytesIO(os.urandom(1000)))
+
+    assert read(storage, 'notes.pdf', start, end) == b''
+
+
+def test_s3_get_raises_other_client_errors(app):
+    client = FakeS3Client()
+
+    def denied(**params):
+        raise client.exceptions.ClientError('AccessDenied', 'GetObject')
+    client.get_object = denied
+    storage = main.S3Storage('course-files', client=client)
+
+    with pytest.raises(client.exceptions.ClientError):
+        read(storage, 'notes.pdf')
+
+
+def test_delete(storage):
+    storage.put('old.txt', io.BytesIO(b'old'))
+
+    storage.delete('old.txt')
+    storage.delete('old.txt')  # deleting a missing key is not an error
+
+    with pytest.raises(FileNotFoundError):
+        read(storage, 'old.txt')
+
+
+def test_local_download_url_is_signed_and_serves_ranges(app):
+    data = os.urandom(4096)
+    main.storage.put('signed.pdf', io.BytesIO(data))
+    client = app.test_client()
+
+    with app.test_request_context():
+        url = main.storage.download_url('signed.pdf', 'Course Notes.pdf')
+
+    response = client.get(url, headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.data == data[100:200]
+    assert client.get(url.replace('signature=', 'signature=0')).status_code == 403
+    main.storage.delete('signed.pdf')
+
+
+def test_local_download_url_for_missing_file(app):
+    with app.test_request_context(), pytest.raises(FileNotFoundError):
+        main.storage.download_url('missing.pdf', 'missing.pdf')
+
+
+def test_s3_download_url_is_presigned():
+    storage = main.S3Storage('course-files', client=FakeS3Client())
+
+    url = urlparse(storage.download_url('lecture.mp4', 'Lecture 1.mp4'))
+
+    assert url.path == '/course-files/lecture.mp4'
+    query = parse_qs(url.query)
+    assert query['X-Amz-Expires'] == ['300']
+    assert query['response-content-disposition'] == ['attachment; filename="Lecture 1.mp4"']
+
+
+def test_s3_large_files_use_parallel_multipart(tmp_path):
+    client = FakeS3Client()
+    storage = main.S3Storage('course-files', client=client, part_size=PART_SIZE)
+    path = tmp_path / 'staged'
+    path.write_bytes(os.urandom(4 * PART_SIZE))
+
+    storage.put_file('big.mp4', str(path))
+
+    assert client.calls.count('upload_part') == 4
+    assert 'put_object' not in client.calls
+
+
+def test_s3_failed_multipart_is_aborted(tmp_path):
+    client = FakeS3Client()
+    client.complete_multipart_upload = lambda **kwargs: (_ for _ in ()).throw(RuntimeError('boom'))
+    storage = main.S3Storage('course-files', client=client, part_size=PART_SIZE)
+    path = tmp_path / 'staged'
+    path.write_bytes(os.urandom(2 * PART_SIZE))
+
+    with pytest.raises(RuntimeError):
+        storage.put_file('big.mp4', str(path))
+
+    assert 'abort_multipart_upload' in client.calls
+    assert path.exists()
+
+
+def test_download_route_redirects_to_backend_url(app, make_user, make_course, login, monkeypatch):
+    monkeypatch.setattr(main, 'storage', main.S3Storage('course-files', client=FakeS3Client()))
+    admin = login(make_user(role='admin'), role='admin')
+    course_id = make_course()
+
+    admin.post(f'/admin/courses/{course_id}/upload',
+               data={'course_files': (io.BytesIO(b'slides'), 'slides.pdf')},
+               content_type='multipart/form-data')
+    with app.app_context():
+        course_file = main.CourseFile.query.filter_by(course_id=course_id).one()
+
+    response = admin.get(f'/download/{course_file.id}')
+    assert response.status_code == 302
+    assert response.location.startswith(f'https://s3.local.test/course-files/{course_file.filename}')
+    assert read(main.storage, course_file.filename) == b'slides'
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def admin(make_user, login):
+    user = make_user(role='admin')
+    return login(user, role='admin')
+
+
+def start_upload(admin, course_id, size, filename='lecture.mp4'):
+    response = admin.post(f'/admin/courses/{course_id}/uploads', json={'filename': filename, 'size': size})
+    assert response.status_code == 201
+    return response.json['upload_id']
+
+
+def put_chunk(client, upload_id, offset, data, checksum=None):
+    return client.put(f'/admin/uploads/{upload_id}', data=data, headers={
+        'Upload-Offset': str(offset),
+        'Upload-Checksum': checksum or hashlib.sha256(data).hexdigest(),
+    })
+
+
+def test_upload_resumes_from_reported_offset(app, admin, make_course):
+    course_id = make_course()
+    data = os.urandom(3 * 1024 * 1024)
+    upload_id = start_upload(admin, course_id, len(data))
+
+    assert put_chunk(admin, upload_id, 0, data[:1024 * 1024]).status_code == 200
+    # The connection "drops"; the client asks where to resume
+    offset = int(admin.head(f'/admin/uploads/{upload_id}').headers['Upload-Offset'])
+    assert put_chunk(admin, upload_id, offset, data[offset:]).status_code == 200
+
+    response = admin.post(f'/admin/uploads/{upload_id}/finalize')
+    assert response.status_code == 200
+    assert b''.join(main.storage.get(response.json['filename'])) == data
+    with app.app_context():
+        course_file = main.db.session.get(main.CourseFile, response.json['file_id'])
+        assert course_file.file_size == len(data)
+        assert main.db.session.get(main.UploadSession, upload_id) is None
+    assert not os.path.exists(main.staging_path(upload_id) + '.lock')
+
+
+def test_rejects_wrong_offset_and_bad_checksum(admin, make_course):
+    upload_id = start_upload(admin, make_course(), 1024)
+    data = os.urandom(512)
+
+    assert put_chunk(admin, upload_id, 100, data).status_code == 409
+    assert put_chunk(admin, upload_id, 0, data, checksum='0' * 64).status_code == 422
+    assert admin.get(f'/admin/uploads/{upload_id}').json['offset'] == 0
+    assert os.path.getsize(main.staging_path(upload_id)) == 0
+
+
+def test_offset_can_be_sent_as_query_parameter(admin, make_course):
+    upload_id = start_upload(admin, make_course(), 1024)
+    data = os.urandom(512)
+
+    response = admin.put(f'/admin/uploads/{upload_id}?offset=0', data=data,
+                         headers={'Upload-Checksum': hashlib.sha256(data).hexdigest()})
+    assert response.status_code == 200
+    assert response.json['offset'] == 512
+    assert response.headers['Upload-Offset'] == '512'
+
+
+@pytest.mark.parametrize('size', ['abc', None, 0])
+def test_rejects_invalid_size(admin, make_course, size):
+    response = admin.post(f'/admin/courses/{make_course()}/uploads', json={'filename': 'lecture.mp4', 'size': size})
+    assert response.status_code == 400
+    assert response.json['error'] == 'Invalid file size'
+
+
+@pytest.mark.parametrize('action', ['chunk', 'finalize'])
+def test_cancel_while_waiting_for_lock_is_not_found(admin, make_course, monkeypatch, action):
+    data = os.urandom(512)
+    upload_id = start_upload(admin, make_course(), len(data))
+    if action == 'finalize':
+        assert put_chunk(admin, upload_id, 0, data).status_code == 200
+    staging_lock = main.staging_lock
+
+    @contextmanager
+    def cancelled_first(upload_id):
+        # A concurrent cancel wins the lock after the request read the session
+        main.UploadSession.query.filter_by(id=upload_id).delete()
+        main.db.session.commit()
+        with staging_lock(upload_id):
+            yield
+    monkeypatch.setattr(main, 'staging_lock', cancelled_first)
+
+    if action == 'chunk':
+        response = put_chunk(admin, upload_id, 0, data)
+    else:
+        response = admin.post(f'/admin/uploads/{upload_id}/finalize')
+    assert response.status_code == 404
+
+
+def test_cancel_after_chunk_is_staged_still_answers(admin, make_course, monkeypatch):
+    data = os.urandom(512)
+    upload_id = start_upload(admin, make_course(), len(data))
+    staging_lock = main.staging_lock
+
+    @contextmanager
+    def cancelled_on_release(upload_id):
+        with staging_lock(upload_id):
+            yield
+        # A concurrent cancel takes the lock as soon as the chunk releases it
+        main.UploadSession.query.filter_by(id=upload_id).delete()
+        main.db.session.commit()
+    monkeypatch.setattr(main, 'staging_lock', cancelled_on_release)
+
+    response = put_chunk(admin, upload_id, 0, data)
+    assert response.status_code == 200
+    assert response.json['offset'] == len(data)
+
+
+def test_racing_chunks_at_same_offset_keep_the_winner(app, make_user, login, make_course):
+    user = make_user(role='admin')
+    chunk_size = 4 * 1024 * 1024
+    valid = os.urandom(chunk_size)
+    corrupt = os.urandom(chunk_size)
+
+    for _ in range(5):
+        upload_id = start_upload(login(user, role='admin'), make_course(), chunk_size)
+        barrier = threading.Barrier(2)
+        statuses = {}
+
+        def send(name, data, checksum):
+            client = login(user, role='admin')
+            barrier.wait()
+            statuses[name] = put_chunk(client, upload_id, 0, data, checksum).status_code
+
+        threads = [
+            threading.Thread(target=send, args=('valid', valid, hashlib.sha256(valid).hexdigest())),
+            threading.Thread(target=send, args=('corrupt', corrupt, hashlib.sha256(valid).hexdigest())),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert statuses == {'valid': 200, 'corrupt': 422}
+        with open(main.staging_path(upload_id), 'rb') as staging:
+            assert staging.read() == valid
+
+
+def test_finalize_refuses_incomplete_staging_file(admin, make_course):
+    data = os.urandom(2048)
+    upload_id = start_upload(admin, make_course(), len(data))
+    put_chunk(admin, upload_id, 0, data)
+
+    os.truncate(main.staging_path(upload_id), 1000)
+
+    response = admin.post(f'/admin/uploads/{upload_id}/finalize')
+    assert response.status_code == 409
+    assert admin.get(f'/admin/uploads/{upload_id}').status_code == 200
+
+
+def test_expired_sessions_are_removed(app, admin, make_course):
+    upload_id = start_upload(admin, make_course(), 1024)
+    with app.app_context():
+        main.db.session.get(main.UploadSession, upload_id).updated_at -= app.config['UPLOAD_SESSION_TTL'] * 2
+        main.db.session.commit()
+        main.expire_upload_sessions()
+        assert main.db.session.get(main.UploadSession, upload_id) is None
+    assert not os.path.exists(main.staging_path(upload_id))